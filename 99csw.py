@@ -2,6 +2,9 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import os
 import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tkinterdnd2 import DND_FILES, TkinterDnD
 from utils import PageList, Progress
 from handlers import SynthesizeHandler
@@ -196,31 +199,66 @@ class FileProcessorGUI:
         progress.set_maximum(total_files)
         progress.update_info(f"Starting to process {total_files} HTML files...")
         
-        # 4. Call the handler to process each file
+        # 4. Call the handler to process each file on a worker thread
+        entries = [(file_path, os.path.basename(file_path)) for file_path in page_list]
+        self.process_btn.configure(state=tk.DISABLED)
+        threading.Thread(
+            target=self._worker,
+            args=(entries, handler, progress),
+            daemon=True
+        ).start()
+    
+    def _worker(self, entries, handler, progress):
+        """Run the handler over (file_path, filename) entries off the Tk thread, posting progress back via after()"""
+        total_files = len(entries)
+        # Post GUI updates only every update_every files or every 50 ms
+        update_every = max(1, total_files // 100)
+        last_update = time.monotonic()
         processed_count = 0
-        for file_path in page_list:
-            # Update info label with filename
-            filename = os.path.basename(file_path)
-            progress.update_info(f"Processing: {filename}")
-            self.root.update()  # Update GUI to show current status
-            
-            # Process the file
-            success = handler(file_path)
-            processed_count += 1
-            
-            # Update progress bar based on file count
-            progress.update_bar(processed_count)
-            
-            # Update info with result
-            if success:
-                progress.update_info(f"Completed: {filename} ({processed_count}/{total_files})")
-            else:
-                progress.update_info(f"Failed: {filename} ({processed_count}/{total_files})")
-            
-            self.root.update()  # Update GUI
-        
-        # Final status
-        progress.update_info(f"Processing complete! {processed_count} files processed successfully.")
+        failed_count = 0
+        # Files are independent, so overlap their I/O on a small thread pool
+        max_workers = min(8, (os.cpu_count() or 1) * 2)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(handler, file_path): filename for file_path, filename in entries}
+                for future in as_completed(futures):
+                    filename = futures[future]
+                    try:
+                        success = future.result()
+                    except Exception as e:
+                        print(f"Error processing {filename}: {e}")
+                        success = False
+                    processed_count += 1
+                    if not success:
+                        failed_count += 1
+                    
+                    # Failures are always reported; progress is throttled
+                    now = time.monotonic()
+                    if not success or processed_count % update_every == 0 or now - last_update > 0.05:
+                        last_update = now
+                        # Update progress bar based on file count
+                        self.root.after(0, progress.update_bar, processed_count)
+                        
+                        # Update info with result
+                        if success:
+                            msg = f"Completed: {filename} ({processed_count}/{total_files})"
+                        else:
+                            msg = f"Failed: {filename} ({processed_count}/{total_files})"
+                        self.root.after(0, progress.update_info, msg)
+        finally:
+            # Always persist what was done and re-enable the GUI, even if the loop failed
+            handler.save_manifests()
+            self.root.after(0, self._on_processing_done, progress, processed_count, failed_count)
+    
+    def _on_processing_done(self, progress, processed_count, failed_count):
+        """Show the final status and re-enable the Process button"""
+        progress.update_bar(processed_count)
+        succeeded_count = processed_count - failed_count
+        if failed_count:
+            progress.update_info(f"Processing complete! {succeeded_count} files processed successfully, {failed_count} failed.")
+        else:
+            progress.update_info(f"Processing complete! {succeeded_count} files processed successfully.")
+        self.process_btn.configure(state=tk.NORMAL)
 
 
 def main():
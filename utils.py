@@ -1,6 +1,5 @@
 import os
-import glob
-from typing import List, Callable, Union, Optional
+from typing import List, Set, Callable, Union, Optional
 import tkinter as tk
 
 
@@ -13,6 +12,8 @@ class PageList:
     def __init__(self):
         """Initialize an empty PageList."""
         self.file_names: List[str] = []
+        # Normalized absolute paths, so a file reached two ways is only listed once
+        self._seen: Set[str] = set()
     
     def append(self, path: Union[str, os.PathLike]) -> None:
         """
@@ -26,21 +27,29 @@ class PageList:
         path = str(path)
         
         if os.path.isfile(path):
-            # Handle single file
-            if path.lower().endswith('.html') and "_2" not in path:
-                if path not in self.file_names:
+            # Handle single file, skipping our own XXXX_2.html outputs
+            name = os.path.basename(path).lower()
+            if name.endswith('.html') and not name.endswith('_2.html'):
+                key = os.path.normcase(os.path.abspath(path))
+                if key not in self._seen:
                     self.file_names.append(path)
+                    self._seen.add(key)
             else:
                 raise ValueError(f"File must be *.html, got: {path}")
                 
         elif os.path.isdir(path):
             # Handle folder - scan first level only
-            html_pattern = os.path.join(path, "*.html")
-            html_files = glob.glob(html_pattern)
-            
-            for html_file in html_files:
-                if html_file not in self.file_names and "_2" not in html_file:
-                    self.file_names.append(html_file)
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    name = entry.name.lower()
+                    if name.endswith('.html') and not name.endswith('_2.html'):
+                        html_file = entry.path
+                        key = os.path.normcase(os.path.abspath(html_file))
+                        if key not in self._seen:
+                            self.file_names.append(html_file)
+                            self._seen.add(key)
         else:
             raise ValueError(f"Path does not exist: {path}")
     
@@ -57,6 +66,7 @@ class PageList:
     def clear(self) -> None:
         """Clear all files from the list."""
         self.file_names.clear()
+        self._seen.clear()
     
     def __len__(self) -> int:
         """Return the number of files in the list."""